@@ -1,10 +1,19 @@
+import argparse
 import glob
 import os
+import sys
+import time
 import logging
 import unicodedata
 from openai import OpenAI
 # from groq import Groq
-from paperreader import PaperSummarizer, NotionManager, RichPaper, MailHandler, read_settings
+from paperreader import PaperSummarizer, NotionManager, RichPaper, MailHandler, WorkQueue, ProviderRouter, RequestPacker, BatchPlanner, read_settings, str_to_bool
+
+# read command line arguments
+parser = argparse.ArgumentParser(description='Summarize research papers and convert the summaries to audio.')
+parser.add_argument('--dry-run', action='store_true', help='only extract and tokenize the papers, estimate tokens, costs and duration and save the plan')
+parser.add_argument('--plan', help='execute a plan saved with --dry-run instead of planning the folder again')
+args = parser.parse_args()
 
 # read setting
 settings = read_settings()
@@ -16,6 +25,18 @@ client = OpenAI(api_key=settings.get('OpenAI_API_Key'))
 # init paper summarizer
 PaperSummarizer.initialize(settings, client)
 
+# init provider router for text requests (all providers must offer an OpenAI-compatible API, e.g. OpenAI or Groq)
+if str_to_bool(settings.get("use_provider_router", "false")):
+    providers = [
+        {
+            'name': provider['name'],
+            'client': OpenAI(api_key=provider.get('api_key'), base_url=provider.get('base_url')),
+            'models': provider.get('models', {})
+        }
+        for provider in settings.get('Providers', [])
+    ]
+    PaperSummarizer.initialize(settings, client, router=ProviderRouter(providers))
+
 # function for file name processing
 def process_file_name(file):
     # remove file endings
@@ -25,10 +46,6 @@ def process_file_name(file):
     # return base name
     return os.path.basename(normalized_name)
 
-# read variables
-def str_to_bool(value):
-    return str(value).lower() in ['true', '1', 'yes']
-
 filedir = settings.get("File_Directory", "./Papers")
 destdir = settings.get("Destination_Directory", "./output")
 create_summary = str_to_bool(settings.get("create_summary", "false"))
@@ -37,49 +54,216 @@ include_notion = str_to_bool(settings.get("include_notion", "false"))
 unlink = str_to_bool(settings.get("remove_pdfs_after_process", "false"))
 sendmail = str_to_bool(settings.get("send_email", "false"))
 
-# read all files in directory
-files_to_read = glob.glob(os.path.join(filedir, '*.pdf'))
+distributed = str_to_bool(settings.get("distributed_mode", "false"))
+pack_requests = str_to_bool(settings.get("pack_requests", "false"))
+
+# init request packer for short papers
+packer = RequestPacker() if pack_requests else None
+
+# in distributed mode, several workers drain the same directory: papers are claimed via lease files
+queue = WorkQueue(file_directory=filedir) if distributed else None
+
+# plan batch without calling any model (models per paper are selected by the routing rules)
+# in distributed mode only papers that were not processed by any worker yet are planned, and only their token
+# counts are kept (each worker processes just a part of them, the texts are read again when a paper is claimed)
+planner = BatchPlanner(create_summary=create_summary, create_audio=create_audio, include_notion=include_notion, keep_texts=not distributed)
+files_to_plan = queue.pending() if distributed else sorted(glob.glob(os.path.join(filedir, '*.pdf')))
+plan = planner.load_plan(args.plan) if args.plan else planner.create_plan(files_to_plan)
+planner.log_plan(plan)
+
+if args.dry_run:
+    planner.save_plan(plan)
+    sys.exit(0)
+
+if not planner.check_budget(plan):
+    logging.error('Batch is not started. Raise Batch_Budget or change the routing rules.')
+    sys.exit(1)
 
-# loop over all files
-for file_path in files_to_read:
+planned_models = {paper['file']: paper['models'] for paper in plan['papers']}
 
-    # extract file name
-    root_name = process_file_name(file_path)
+# function for grouping papers by the model selected for a stage
+def group_by_model(models, stage, indices):
+    groups = {}
+    for i, paper_models in zip(indices, models):
+        groups.setdefault(paper_models.get(stage), []).append(i)
+    return groups
 
-    # init RichPaper object and read paper
-    logging.info(f'Read PDF file: {file_path}')
-    obj = RichPaper(path=file_path)
-    obj.get_paper_and_metrices()
+# function for processing a batch of papers (an error only affects the paper it occurs in)
+def process_papers(file_paths):
 
-    # create summary
+    # extract file names
+    filenames = [os.path.join(destdir, process_file_name(file_path)) for file_path in file_paths]
+    errors = [None] * len(file_paths)
+
+    def failed(i, step, e):
+        logging.exception(f'Error during {step} of {file_paths[i]}: {e}')
+        errors[i] = f'{step}: {e}'
+
+    def active():
+        return [i for i in range(len(file_paths)) if errors[i] is None]
+
+    # in distributed mode, papers whose lease was lost (taken over by another worker) are not processed any further
+    def lease_lost(i):
+        if distributed and errors[i] is None and not queue.holds(file_paths[i]):
+            logging.warning(f'Lease of {file_paths[i]} was lost, stop processing it.')
+            errors[i] = 'lease lost'
+        return errors[i] is not None
+
+    # init RichPaper objects and read papers
+    objs = []
+    models = []
+    for i, file_path in enumerate(file_paths):
+        logging.info(f'Read PDF file: {file_path}')
+        paper_models = planned_models.get(os.path.basename(file_path), {})
+        obj = RichPaper(path=file_path)
+        objs.append(obj)
+        models.append(paper_models)
+        try:
+            # reuse text (not kept in distributed mode) and token count extracted by the planner
+            text, n_tokens = planner.extracted.pop(file_path, (None, None))
+            obj.paper = text
+            obj.get_paper_and_metrices(metadata_model=paper_models.get('metadata'), n_tokens=n_tokens)
+
+            # route papers that were added after planning
+            models[i] = paper_models or planner.route_paper(obj.paper_metrices['n_tokens_paper'])
+        except Exception as e:
+            failed(i, 'reading', e)
+
+    # create summaries (short papers share one request if packing is activated)
     if create_summary:
-        logging.info('Create summary')
-        filename = os.path.join(destdir, root_name)
-        obj.create_summary(filename=filename+'_summary')
+        logging.info('Create summaries')
+        for i in active():
+            lease_lost(i)
+        if pack_requests:
+            for model_name, indices in group_by_model([models[i] for i in active()], 'summary', active()).items():
+                try:
+                    packer.create_summaries([objs[i] for i in indices], filenames=[filenames[i]+'_summary' for i in indices], model_name=model_name)
+                except Exception as e:
+                    for i in indices:
+                        if objs[i].summary is None:
+                            failed(i, 'summary', e)
+        else:
+            for i in active():
+                try:
+                    objs[i].create_summary(model_name=models[i].get('summary'), filename=filenames[i]+'_summary')
+                except Exception as e:
+                    failed(i, 'summary', e)
         logging.info(f'Succesfully created | {PaperSummarizer.generation_costs = }')
 
-    # create audio from summary
+    # create audio from summaries
     if create_summary and create_audio:
-        logging.info('Create audio from summary')
-        obj.create_audio_from_summary(filename=filename) # text export currently not supported by OpenAI
-        logging.info(f'Succesfully created | {PaperSummarizer.generation_costs = }')
+        for i in active():
+            if lease_lost(i):
+                continue
+            logging.info('Create audio from summary')
+            try:
+                objs[i].create_audio_from_summary(filename=filenames[i], model_name=models[i].get('audio')) # text export currently not supported by OpenAI
+            except Exception as e:
+                failed(i, 'audio', e)
+            logging.info(f'Succesfully created | {PaperSummarizer.generation_costs = }')
 
-    # add summary to Notion Database if activated
+    # add summaries to Notion Database if activated
     if include_notion:
-        logging.info('Add paper to Notion Database')
-        noti = NotionManager(paper_metrices=obj.paper_metrices, paper_summary=obj.summary)
-        noti.check_and_add_missing_properties()
-        noti.add_paper_to_database()
-        logging.info(f'{PaperSummarizer.generation_costs = }')
-
-    # remove pdf after processing if activated
-    if unlink:
-        logging.info('Remove PDF after processing')
-        os.remove(file_path)
-
-# send mail with all audio files if activated
-if sendmail:
+        essences = [None] * len(objs)
+        if pack_requests:
+            for model_name, indices in group_by_model([models[i] for i in active()], 'essence', active()).items():
+                try:
+                    for i, essence in zip(indices, packer.create_one_line_summaries([objs[i].summary for i in indices], model_name=model_name)):
+                        essences[i] = essence
+                except Exception as e:
+                    logging.error(f'Error creating packed one-line summaries: {e}')
+        for i in active():
+            if lease_lost(i):
+                continue
+            logging.info('Add paper to Notion Database')
+            try:
+                noti = NotionManager(paper_metrices=objs[i].paper_metrices, paper_summary=objs[i].summary, paper_essence=essences[i])
+                noti.check_and_add_missing_properties()
+                noti.add_paper_to_database(essence=essences[i] if essences[i] is not None else noti.create_one_line_summary(model_name=models[i].get('essence')))
+            except Exception as e:
+                failed(i, 'Notion upload', e)
+            logging.info(f'{PaperSummarizer.generation_costs = }')
+
+    return objs, errors
+
+# function for sending all audio files and summaries via mail
+def send_report(records):
+    PaperSummarizer.created_summaries = [record['summary'] for record in records if record.get('summary')]
+    filenames = [record['audio_file'] for record in records if record.get('audio_file')]
+
+    # audio files of other workers can only be attached if Destination_Directory is shared between all workers
+    for record in records:
+        if record.get('audio_file') and not os.path.exists(record['audio_file']):
+            logging.warning(f"Audio file {record['audio_file']} of worker {record['worker']} not found. Is Destination_Directory shared between all workers?")
+    filenames = [filename for filename in filenames if os.path.exists(filename)]
     mailer = MailHandler()
-    mp3files = [f"{process_file_name(file)}.{settings.get('Audio_Format', 'mp3')}" for file in files_to_read]
-    filenames = [os.path.join(destdir, file) for file in mp3files]
     mailer.send_email(filenames)
+
+def audio_file_name(file_path):
+    return os.path.join(destdir, f"{process_file_name(file_path)}.{settings.get('Audio_Format', 'mp3')}")
+
+if distributed:
+    claim_size = int(settings.get("Worker_Claim_Size", 1))
+    logging.info(f'Start worker {queue.worker_id} on {filedir}')
+
+    try:
+        while True:
+            claimed = queue.claim_batch(claim_size)
+
+            # wait for papers leased by other workers (they are reclaimed if a worker crashes)
+            if not claimed:
+                if not queue.pending():
+                    break
+                time.sleep(queue.poll_interval)
+                continue
+
+            objs, errors = process_papers(claimed)
+            records = [
+                {
+                    'status': 'done' if error is None else 'failed',
+                    'summary': obj.summary,
+                    'audio_file': audio_file_name(file_path) if create_summary and create_audio and error is None else None,
+                    **({'error': error} if error is not None else {})
+                }
+                for file_path, obj, error in zip(claimed, objs, errors)
+            ]
+
+            for file_path, record in zip(claimed, records):
+                queue.complete(file_path, record, remove_pdf=unlink and record['status'] == 'done')
+
+        # send one mail per batch (only the worker holding the report lease sends it)
+        if sendmail:
+            queue.report(send_report)
+
+    finally:
+        queue.shutdown()
+        PaperSummarizer.save_throughput()
+
+else:
+    # read all planned files (papers that could not be read are skipped)
+    files_to_read = [paper['path'] for paper in plan['papers'] if 'error' not in paper and os.path.exists(paper['path'])]
+
+    # process all files (in chunks of a few packs if requests are packed, otherwise one by one)
+    chunk_size = packer.max_documents * 4 if pack_requests else 1
+    batches = [files_to_read[i:i + chunk_size] for i in range(0, len(files_to_read), chunk_size)]
+    processed = []
+    for batch in batches:
+        _, errors = process_papers(batch)
+
+        for file_path, error in zip(batch, errors):
+            if error is not None:
+                continue
+            processed.append(file_path)
+
+            # remove pdf after processing if activated
+            if unlink:
+                logging.info('Remove PDF after processing')
+                os.remove(file_path)
+
+    PaperSummarizer.save_throughput()
+
+    # send mail with all audio files if activated
+    if sendmail:
+        mailer = MailHandler()
+        filenames = [audio_file_name(file) for file in processed]
+        mailer.send_email(filenames)
@@ -8,7 +8,13 @@ import tiktoken
 import requests
 import json
 import smtplib
+import socket
+import threading
+import time
+import uuid
 import fitz
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import date
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
@@ -39,12 +45,39 @@ def read_settings(path='settings.json'):
         return {}
 
 
+# define function to read boolean values from the settings
+def str_to_bool(value):
+    return str(value).lower() in ['true', '1', 'yes']
+
+
+# define function to write files atomically
+def atomic_write(path, data, mode='w'):
+    """
+    Writes data to a temporary file next to the target and renames it into place,
+    so that other processes never see a partially written file.
+    :param path: Path of the target file.
+    :param data: Content to write (str for text mode, bytes for binary mode).
+    :param mode: File mode ('w' for text or 'wb' for binary).
+    """
+    tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    kwargs = {} if 'b' in mode else {'encoding': 'utf-8'}
+    try:
+        with open(tmp_path, mode, **kwargs) as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
 # define main class
 class PaperSummarizer:
     settings = None
     client = None
+    router = None
     generation_costs = {'input_tokens': 0, 'output_tokens': 0}
     created_summaries = []
+    model_throughput = {}
 
     def get_price_factors(self, model_name, in_modality='text', out_modality='text'):
         """
@@ -70,6 +103,9 @@ class PaperSummarizer:
             'gpt-4o-mini': {
                 'text': {'input_factor': 0.15, 'output_factor': 0.6}
             },
+            'gpt-4.1-nano': {
+                'text': {'input_factor': 0.1, 'output_factor': 0.4}
+            },
             'tts-1-hd': {
                 'text': {'input_factor': 8, 'output_factor': 8} # rough estimation - price is calculated based on the number of characters rather than tokens (Char-Price: 30/Million Chars)
             }
@@ -89,7 +125,7 @@ class PaperSummarizer:
         num_tokens = len(encoding.encode(string))
         return num_tokens
     
-    def call_model(self, instruction, prompt, model_name=None, voice=None, filename=None, file_format=None):
+    def call_model(self, instruction, prompt, model_name=None, voice=None, filename=None, file_format=None, json_mode=False):
         """
         Calls LLM model, calculates costs for inference and returns the response text.
         :param instruction: Instruction for the model.
@@ -98,6 +134,7 @@ class PaperSummarizer:
         :param voice: Voice for audio output.
         :param filename: Name of the file to save the audio output.
         :param file_format: Format of the audio file.
+        :param json_mode: If True, requests a JSON object as response (only for models that support it).
         :return: Response text from the model.
         """
         model_name = model_name if model_name else self.settings.get('Summarizer_Model', 'gpt-4o-mini')
@@ -108,6 +145,9 @@ class PaperSummarizer:
 
         logging.info(f'Settings: Model: {model_name} | Language: {lang} | Voice: {voice} | Format: {file_format} | Input length: {n_tokens} tokens')
 
+        response = None
+        served_model = model_name
+        start = time.perf_counter()
         try:
             if 'tts' in model_name:
                 # shorten summary if too long for TTS
@@ -125,7 +165,24 @@ class PaperSummarizer:
 
                 # save locally
                 if filename and file_format:
-                    audio_file.stream_to_file(f'{filename}.{file_format}')
+                    tmp_path = f'{filename}.{uuid.uuid4().hex}.tmp'
+                    audio_file.stream_to_file(tmp_path)
+                    os.replace(tmp_path, f'{filename}.{file_format}')
+
+            elif self.router is not None and 'audio-preview' not in model_name:
+                # route text request to the fastest healthy provider
+                messages = [
+                    {"role": "system", "content": instruction},
+                    {"role": "user", "content": prompt}
+                ]
+                response, served_model = self.router.complete(model_name, messages, json_mode=json_mode)
+
+                # get response text
+                response_text = response.choices[0].message.content.strip()
+
+                # save response text locally
+                if filename:
+                    atomic_write(f'{filename}.txt', response_text)
 
             else:
                 # set up kwargs for model call (make sure both openAI and groq Clients are supported)
@@ -135,7 +192,8 @@ class PaperSummarizer:
                         {"role": "system", "content": instruction},
                         {"role": "user", "content": prompt}
                     ],
-                    **({"modalities": out_modality, "audio": audio} if 'gpt' in model_name else {})
+                    **({"modalities": out_modality, "audio": audio} if 'gpt' in model_name else {}),
+                    **({"response_format": {"type": "json_object"}} if json_mode and 'gpt' in model_name and 'audio-preview' not in model_name else {})
                 }
                 # call text model
                 response = self.client.chat.completions.create(**kwargs)
@@ -145,20 +203,30 @@ class PaperSummarizer:
 
                 # save response text locally
                 if filename:
-                    with open(f'{filename}.txt', 'w', encoding='utf-8') as file:
-                        file.write(response_text)
+                    atomic_write(f'{filename}.txt', response_text)
             
             # if audio was created with openai model (except with tts, see above): save audio file locally
             if 'audio-preview' in model_name and filename and file_format:
                 audio_file = base64.b64decode(response.choices[0].message.audio.data)
-                with open(f'{filename}.{file_format}', 'wb') as f:
-                    f.write(audio_file)
-
-            # calculate and add costs
-            if 'gpt' in model_name:
-                input_factor, output_factor = self.get_price_factors(model_name, 'text', out_modality[0])
-                PaperSummarizer.generation_costs['input_tokens'] += round((response.usage.prompt_tokens / 1000000) * input_factor, 4)
-                PaperSummarizer.generation_costs['output_tokens'] += round((response.usage.completion_tokens / 1000000) * output_factor, 4)
+                atomic_write(f'{filename}.{file_format}', audio_file, mode='wb')
+
+            # calculate and add costs (when routed, served_model is the model that served the response)
+            if 'gpt' in served_model:
+                try:
+                    input_factor, output_factor = self.get_price_factors(served_model, 'text', out_modality[0])
+                    PaperSummarizer.generation_costs['input_tokens'] += round((response.usage.prompt_tokens / 1000000) * input_factor, 4)
+                    PaperSummarizer.generation_costs['output_tokens'] += round((response.usage.completion_tokens / 1000000) * output_factor, 4)
+                except ValueError as e:
+                    logging.warning(f'{e} Costs of this call are not counted.')
+            elif response is not None:
+                logging.warning(f"Costs of model '{served_model}' are unknown and not counted.")
+
+            # measure throughput for the pre-flight planner (under the requested model, which the planner looks up)
+            if response is not None and getattr(response, 'usage', None):
+                seconds = time.perf_counter() - start
+                self.record_throughput(model_name, response.usage.completion_tokens, seconds)
+                if served_model != model_name:
+                    self.record_throughput(served_model, response.usage.completion_tokens, seconds)
 
         except Exception as e:
             response_text = ''
@@ -166,22 +234,272 @@ class PaperSummarizer:
 
         return response_text
     
+    def record_throughput(self, model_name, output_tokens, seconds):
+        """
+        Adds the duration and the number of output tokens of a model call to the throughput measurements.
+        """
+        measurement = PaperSummarizer.model_throughput.setdefault(model_name, {'calls': 0, 'output_tokens': 0, 'seconds': 0})
+        measurement['calls'] += 1
+        measurement['output_tokens'] += output_tokens
+        measurement['seconds'] += seconds
+
+    @classmethod
+    def load_throughput(cls, path=None):
+        """
+        Reads the throughput measurements of previous runs.
+        :param path: Path to the throughput file ('throughput.json' as default).
+        :return: Dictionary with calls, output tokens and seconds per model.
+        """
+        path = path if path is not None else cls.settings.get('Throughput_File', 'throughput.json')
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logging.error(f"Error reading throughput file: {e}")
+            return {}
+
+    @classmethod
+    def save_throughput(cls, path=None):
+        """
+        Adds the throughput measurements of this run to the throughput file.
+        :param path: Path to the throughput file ('throughput.json' as default).
+        """
+        path = path if path is not None else cls.settings.get('Throughput_File', 'throughput.json')
+        if not cls.model_throughput:
+            return
+
+        throughput = cls.load_throughput(path)
+        for model_name, measurement in cls.model_throughput.items():
+            total = throughput.setdefault(model_name, {'calls': 0, 'output_tokens': 0, 'seconds': 0})
+            for key in total:
+                total[key] += measurement[key]
+        atomic_write(path, json.dumps(throughput, indent=4))
+        cls.model_throughput = {}
+
+    def language_suffix(self):
+        """Returns the prompt suffix asking for the text output language."""
+        lang = self.settings.get('Text_Output_Language', 'English')
+        return f" Please answer in {lang}." if lang != "English" else ""
+
+    def call_model_packed(self, instruction, task, documents, model_name=None):
+        """
+        Sends several short documents to the LLM in a single request and splits the structured response.
+        :param instruction: Instruction for the model (sent once for all documents).
+        :param task: Task that is applied to every document.
+        :param documents: List of document texts.
+        :param model_name: Name of the model to use.
+        :return: List with one answer per document (None if the answer for a document could not be parsed).
+        """
+        prompt = (
+            f'{task}\n\n'
+            'The documents are delimited by <document id="..."> tags. Handle every document separately. '
+            'Answer only with a JSON object of the form {"documents": [{"id": <id>, "answer": "<answer>"}]} '
+            'containing one entry for every document.\n\n'
+        )
+        prompt += '\n\n'.join(f'<document id="{i}">\n{document}\n</document>' for i, document in enumerate(documents))
+        output = self.call_model(instruction, prompt, model_name=model_name, json_mode=True)
+
+        # split response (strip markdown code fences the model may add)
+        answers = [None] * len(documents)
+        try:
+            content = re.sub(r'^```(?:json)?|```$', '', output.strip()).strip()
+            for entry in json.loads(content).get('documents', []):
+                i = int(entry['id'])
+                if 0 <= i < len(documents) and isinstance(entry.get('answer'), str) and entry['answer'].strip():
+                    answers[i] = entry['answer'].strip()
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            logging.warning(f'Packed response could not be parsed: {e}')
+
+        return answers
+
     @classmethod
-    def initialize(cls, settings, client):
+    def initialize(cls, settings, client, router=None):
         cls.settings = settings
         cls.client = client
+        cls.router = router
+
+
+class ProviderRouter(PaperSummarizer):
+    def __init__(self, providers):
+        """
+        Initializes the router with several OpenAI-compatible providers.
+        :param providers: List of dictionaries with 'name', 'client' and 'models' (mapping of requested model name to the provider's model name, empty to serve every model under its own name).
+        """
+        self.providers = providers
+        self.window = int(self.settings.get('Router_Window', 50))
+        self.max_error_rate = float(self.settings.get('Router_Max_Error_Rate', 0.5))
+        self.cooldown = float(self.settings.get('Router_Cooldown', 60))
+        self.hedge = str_to_bool(self.settings.get('Hedge_Requests', 'false'))
+        self.timeout = float(self.settings.get('Router_Timeout', 120))
+        self.hedge_min_delay = float(self.settings.get('Hedge_Min_Delay', 2))
+        self.hedge_default_delay = float(self.settings.get('Hedge_Default_Delay', 30))
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def get_stats(self, provider_name, model_name):
+        """Returns the statistics of a provider and model (must be called while holding self.lock)."""
+        key = (provider_name, model_name)
+        if key not in self.stats:
+            self.stats[key] = {'latencies': deque(maxlen=self.window), 'errors': deque(maxlen=self.window), 'last_error': 0, 'in_flight': 0}
+        return self.stats[key]
+
+    def record(self, provider_name, model_name, latency=None, error=False):
+        """
+        Adds the outcome of a request to the rolling statistics of a provider and model.
+        """
+        with self.lock:
+            stats = self.get_stats(provider_name, model_name)
+            stats['in_flight'] -= 1
+            stats['errors'].append(error)
+            if error:
+                stats['last_error'] = time.time()
+            else:
+                stats['latencies'].append(latency)
+
+    def percentile(self, provider_name, model_name, q):
+        """
+        Returns the q-th percentile of the rolling latency (None if no requests were measured yet).
+        """
+        with self.lock:
+            latencies = sorted(self.get_stats(provider_name, model_name)['latencies'])
+        if not latencies:
+            return None
+        return latencies[int(q * (len(latencies) - 1))]
+
+    def is_healthy(self, provider_name, model_name):
+        """
+        Checks the rolling error rate. Unhealthy providers are tried again after the cooldown.
+        """
+        with self.lock:
+            stats = self.get_stats(provider_name, model_name)
+            errors = list(stats['errors'])
+            last_error = stats['last_error']
+        if len(errors) < 3 or time.time() - last_error > self.cooldown:
+            return True
+        return sum(errors) / len(errors) < self.max_error_rate
+
+    def rank(self, model_name):
+        """
+        Returns all providers serving the requested model, healthy and fast ones first.
+        :param model_name: Requested model name (e.g. 'gpt-4o-mini').
+        :return: List of (provider, provider_model_name) tuples.
+        """
+        candidates = []
+        for provider in self.providers:
+            models = provider.get('models') or {model_name: model_name}
+            if model_name in models:
+                candidates.append((provider, models[model_name]))
+
+        # unmeasured providers get a latency of 0, so that they are tried early on (unless they already failed or are busy)
+        def sort_key(candidate):
+            provider, provider_model = candidate
+            median = self.percentile(provider['name'], provider_model, 0.5)
+            if median is None:
+                with self.lock:
+                    stats = self.get_stats(provider['name'], provider_model)
+                    has_errors, in_flight = bool(stats['errors']), stats['in_flight']
+                median = float('inf') if has_errors else self.hedge_default_delay if in_flight else 0
+            return (not self.is_healthy(provider['name'], provider_model), median)
+
+        return sorted(candidates, key=sort_key)
+
+    def hedge_delay(self, provider_name, model_name):
+        """
+        Returns the time to wait before a hedged duplicate request is sent (p95 of the provider's latency).
+        """
+        p95 = self.percentile(provider_name, model_name, 0.95)
+        return max(self.hedge_min_delay, p95 if p95 is not None else self.hedge_default_delay)
+
+    def request(self, candidate, messages, json_mode=False):
+        """
+        Sends a chat completion request to one provider and records latency and errors.
+        The request timeout is bounded, so that abandoned hedged requests end promptly.
+        JSON mode is only requested from OpenAI models.
+        """
+        provider, provider_model = candidate
+        with self.lock:
+            self.get_stats(provider['name'], provider_model)['in_flight'] += 1
+        start = time.perf_counter()
+        try:
+            client = provider['client'].with_options(timeout=self.timeout)
+            kwargs = {"response_format": {"type": "json_object"}} if json_mode and 'gpt' in provider_model else {}
+            response = client.chat.completions.create(model=provider_model, messages=messages, **kwargs)
+        except Exception:
+            self.record(provider['name'], provider_model, error=True)
+            raise
+        self.record(provider['name'], provider_model, latency=time.perf_counter() - start)
+        return response
+
+    def complete(self, model_name, messages, json_mode=False):
+        """
+        Sends a text request to the fastest healthy provider and falls back to the next one if it fails.
+        If hedging is enabled and the provider does not answer within its p95 latency, a duplicate is sent
+        to the next provider and the first response wins. Only the winning response is returned, so only
+        its costs are counted.
+        :param model_name: Requested model name.
+        :param messages: Chat messages.
+        :param json_mode: If True, requests a JSON object as response.
+        :return: Tuple with (response, name of the model that served the response).
+        """
+        candidates = self.rank(model_name)
+        if not candidates:
+            raise ValueError(f"No provider configured for model '{model_name}'.")
+
+        primary = candidates[0]
+        backups = candidates[1:]
+        logging.info(f"Routing request to {primary[0]['name']} ({primary[1]})")
+
+        executor = ThreadPoolExecutor(max_workers=len(backups) + 1)
+        futures = {executor.submit(self.request, primary, messages, json_mode): primary}
+        timeout = self.hedge_delay(primary[0]['name'], primary[1]) if self.hedge and backups else None
+        last_error = None
+
+        try:
+            while futures:
+                done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    candidate = futures.pop(future)
+                    try:
+                        return future.result(), candidate[1]
+                    except Exception as e:
+                        last_error = e
+                        logging.warning(f"Request to {candidate[0]['name']} ({candidate[1]}) failed: {e}")
+
+                # send duplicate to the next provider when the request is too slow (hedging) or failed
+                if backups and (not done or not futures):
+                    backup = backups.pop(0)
+                    logging.info(f"Sending hedged request to {backup[0]['name']} ({backup[1]})")
+                    futures[executor.submit(self.request, backup, messages, json_mode)] = backup
+                    timeout = self.hedge_delay(backup[0]['name'], backup[1]) if self.hedge and backups else None
+                elif not done:
+                    timeout = None
+
+            raise last_error
+
+        finally:
+            # cancel pending requests, running losers finish in the background and are ignored
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
 
 
 class NotionManager(PaperSummarizer):
-    def __init__(self, paper_metrices=None, paper_summary=None):
+    one_line_instruction = 'Summarize the following text in one line. Like "Investigates the relationship between chinese and european foreign politics with NLP methods" or "Analyzes the impact of climate change on the global economy".'
+
+    def __init__(self, paper_metrices=None, paper_summary=None, paper_essence=None):
         """
         Initializes the NotionManager with the given paper metrices and summary.
         :param paper_metrices: Dictionary containing the paper metrices.
         :param paper_summary: Summary of the paper.
+        :param paper_essence: One-line summary of the paper (created on demand if not provided).
         """
         self.notion_header = self.build_header()
         self.paper_metrices = paper_metrices
         self.summary = paper_summary
+        self.essence = paper_essence
 
     def build_header(self):
         """
@@ -316,7 +634,7 @@ class NotionManager(PaperSummarizer):
 
         return blocks
 
-    def add_paper_to_database(self, author=None, year=None, title=None, summary=None, project_name=None, abstract=None, doi_link=None):
+    def add_paper_to_database(self, author=None, year=None, title=None, summary=None, project_name=None, abstract=None, doi_link=None, essence=None):
         """
         Creates a new page in the Notion database with the given paper metrices.
         :param author: Author of the paper.
@@ -326,6 +644,7 @@ class NotionManager(PaperSummarizer):
         :param project_name: Name of the project.
         :param abstract: Abstract of the paper.
         :param doi_link: DOI link of the paper.
+        :param essence: One-line summary of the paper.
         """
         # check if paper_metrices have valid values
         self.validate_paper_metrices()
@@ -341,6 +660,7 @@ class NotionManager(PaperSummarizer):
         project_name = project_name if project_name is not None else self.paper_metrices.get('project_name', '')
         abstract = abstract if abstract is not None else self.paper_metrices.get('abstract', '')
         doi_link = doi_link if doi_link is not None else self.paper_metrices.get('doi_link', '')
+        essence = essence if essence is not None else self.essence if self.essence else self.create_one_line_summary(summary)
 
         # create properties for the new page
         properties = {
@@ -348,7 +668,7 @@ class NotionManager(PaperSummarizer):
             "Author": {"rich_text": [{"text": {"content": author}}]},
             "Year": {"number": year},
             "Added": {"date": {"start": added}},
-            "Essence": {"rich_text": [{"text": {"content": self.create_one_line_summary(summary)}}]},
+            "Essence": {"rich_text": [{"text": {"content": essence}}]},
             "Status": {"select": {"name": "To Do", "color": "red"}},
             "URL": {"url": doi_link}
         }
@@ -387,41 +707,50 @@ class NotionManager(PaperSummarizer):
         else:
             logging.error(f"Failed to create page: {response.text}")
 
-    def create_one_line_summary(self, summary=None):
+    def create_one_line_summary(self, summary=None, model_name=None):
         """
         Creates a one-line summary of the given text.
         :param summary: Text to summarize.
+        :param model_name: The name of the model to use.
         :return: One-line summary of the text.
         """
         summary = summary if summary is not None else self.summary
-        instruction = 'Summarize the following text in one line. Like "Investigates the relationship between chinese and european foreign politics with NLP methods" or "Analyzes the impact of climate change on the global economy".'
-        return self.call_model(instruction, summary)
+        return self.call_model(self.one_line_instruction, summary, model_name=model_name)
     
 
+
 class RichPaper(PaperSummarizer):
+    metadata_pattern = r'^(?P<author>(?:[\w\s.]+(?:,\s*)?)+?)\s+\((?P<year>\d{4})\)\s+(?P<title>.+)$'
+    metadata_instruction = 'Please extract from the following text the information about the author(s), the publishing year and the title. Provide the information in the following format: author (year) title'
+    summary_instruction = 'You are a research assistant specializing in summarizing research papers.'
+    summary_prompt = 'Your task is to write a detailed summary of the following research paper. Focus on the methodology and the results of the paper. Finally relate the results to other research on this topic.'
+
     def __init__(self, path=None):
         self.path = path
         self.paper = None
         self.paper_metrices = None
         self.summary = None
     
-    def get_paper_and_metrices(self):
+    def get_paper_and_metrices(self, metadata_model=None, n_tokens=None):
         """
         Reads the paper from the given path and extracts the metrices.
         Adds data like author, title and year based on document names or info from PDF.
         Adds the project name from settings.csv to the metrices, Extracts the DOI of the paper and generates a link to find the paper.
         Extracts the abstract from the paper.
+        :param metadata_model: Model used if the meta data is not contained in the document name ('local' to skip the LLM).
+        :param n_tokens: Number of tokens of the paper if it was already extracted (e.g. by the BatchPlanner).
         """
         
-        # read paper
-        self.read_pdf(self.path)
+        # read paper (unless the text was already extracted)
+        if self.paper is None:
+            self.read_pdf(self.path)
         
         # get author year and date information
         filename = os.path.splitext(os.path.basename(self.path))[0]
-        metrices = self.get_author_year_title(filename)
+        metrices = self.get_author_year_title(filename, model_name=metadata_model)
 
         # add num tokens
-        metrices['n_tokens_paper'] = self.num_tokens_from_string(self.paper, 'o200k_base')
+        metrices['n_tokens_paper'] = n_tokens if n_tokens is not None else self.num_tokens_from_string(self.paper, 'o200k_base')
 
         # add project name
         metrices['project_name'] = self.settings.get('Notion_Project_Name', '')
@@ -467,16 +796,17 @@ class RichPaper(PaperSummarizer):
             self.paper = None
 
 
-    def get_author_year_title(self, paper_title):
+    def get_author_year_title(self, paper_title, model_name=None):
         """
         Extacts information about author, year and title from the document name.
         If this information is not contained in the document name, the LLM tries to estimate it.
         :param paper_title: The title of the paper.
+        :param model_name: The name of the model to use ('local' to only use the document name).
         :return: A dictionary with the extracted metrices.
         """
 
         # regex pattern for extracting author, year and title from document name
-        pattern = r'^(?P<author>(?:[\w\s.]+(?:,\s*)?)+?)\s+\((?P<year>\d{4})\)\s+(?P<title>.+)$'
+        pattern = self.metadata_pattern
         match = re.match(pattern, paper_title)
 
         metrices = {}
@@ -484,10 +814,12 @@ class RichPaper(PaperSummarizer):
         if match:
             metrices = match.groupdict()
             metrices['year'] = int(metrices['year']) # year as integer
+        elif model_name == 'local':
+            logging.warning("Meta data could not be extracted from the document name (LLM disabled for this paper).")
+            metrices = {'author': 'Unknown', 'year': 0, 'title': 'Unknown'}
         else:
-            instruction = 'Please extract from the following text the information about the author(s), the publishing year and the title. Provide the information in the following format: author (year) title'
             try:
-                content = self.call_model(instruction, self.paper[:1000])
+                content = self.call_model(self.metadata_instruction, self.paper[:1000], model_name=model_name)
                 match = re.match(pattern, content)
                 if match:
                     metrices = match.groupdict()
@@ -537,14 +869,10 @@ class RichPaper(PaperSummarizer):
             logging.warning("No PDF provided.")
             return
 
-        # set language for text output
-        lang = self.settings.get('Text_Output_Language', 'English')
-        suffix = f" Please answer in {lang}." if lang != "English" else ""
-
         # call llm to summarize paper
-        instruction = 'You are a research assistant specializing in summarizing research papers.' if instruction is None else instruction
-        prompt = prompt if prompt is not None else 'Your task is to write a detailed summary of the following research paper. Focus on the methodology and the results of the paper. Finally relate the results to other research on this topic.'
-        prompt  = f'{prompt}{suffix}\n\n{self.paper}'
+        instruction = self.summary_instruction if instruction is None else instruction
+        prompt = prompt if prompt is not None else self.summary_prompt
+        prompt  = f'{prompt}{self.language_suffix()}\n\n{self.paper}'
         output = self.call_model(instruction, prompt, model_name=model_name, filename=filename)
         
         # store summary in object
@@ -662,4 +990,591 @@ class MailHandler(PaperSummarizer):
                 server.send_message(msg)
                 logging.info(f"Succesfully sent email to {len(recipients)} recipients.")
         except Exception as e:
-            logging.error(f"Error sending email: {e}")
\ No newline at end of file
+            logging.error(f"Error sending email: {e}")
+
+
+class WorkQueue(PaperSummarizer):
+    def __init__(self, file_directory=None, worker_id=None):
+        """
+        Initializes a work queue that lets several workers drain one shared paper directory.
+        Papers are claimed with lease files next to the PDFs, so no external broker is required.
+        :param file_directory: Shared directory containing the PDF files.
+        :param worker_id: Unique name of this worker (hostname and process id as default).
+        """
+        self.file_directory = file_directory if file_directory is not None else self.settings.get('File_Directory', './Papers')
+        self.worker_id = worker_id if worker_id is not None else self.settings.get('Worker_Id') or f'{socket.gethostname()}-{os.getpid()}'
+        self.lease_timeout = float(self.settings.get('Lease_Timeout', 300))
+        self.heartbeat_interval = float(self.settings.get('Lease_Heartbeat', self.lease_timeout / 5))
+        self.poll_interval = float(self.settings.get('Worker_Poll_Interval', 10))
+
+        # set up state directories
+        state_dir = os.path.join(self.file_directory, '.paperreader')
+        self.lease_dir = os.path.join(state_dir, 'leases')
+        self.done_dir = os.path.join(state_dir, 'done')
+        self.reported_dir = os.path.join(state_dir, 'reported')
+        self.failed_dir = os.path.join(state_dir, 'failed')
+        self.report_lease = os.path.join(state_dir, 'report.lease')
+        for directory in [self.lease_dir, self.done_dir, self.reported_dir, self.failed_dir]:
+            os.makedirs(directory, exist_ok=True)
+
+        # papers that failed after this time are not retried in this run
+        self.started = time.time()
+
+        # leases held by this worker (lease path -> token)
+        self.leases = {}
+        self.stop_heartbeat = threading.Event()
+        self.heartbeat_thread = None
+
+    def list_papers(self):
+        """
+        Returns all PDF files in the shared directory.
+        """
+        return sorted(glob.glob(os.path.join(self.file_directory, '*.pdf')))
+
+    def lease_path(self, file_path):
+        return os.path.join(self.lease_dir, os.path.basename(file_path) + '.lease')
+
+    def record_path(self, file_path, directory=None):
+        directory = directory if directory is not None else self.done_dir
+        return os.path.join(directory, os.path.basename(file_path) + '.json')
+
+    def is_done(self, file_path):
+        """
+        Checks if a paper was already processed by any worker.
+        """
+        return os.path.exists(self.record_path(file_path)) or os.path.exists(self.record_path(file_path, self.reported_dir))
+
+    def failed_in_run(self, file_path):
+        """
+        Checks if a paper failed since this worker was started (it is retried in the next run).
+        """
+        try:
+            return os.path.getmtime(self.record_path(file_path, self.failed_dir)) >= self.started
+        except FileNotFoundError:
+            return False
+
+    def pending(self):
+        """
+        Returns all papers that were not processed yet (including papers leased by other workers).
+        """
+        return [file_path for file_path in self.list_papers() if not self.is_done(file_path) and not self.failed_in_run(file_path)]
+
+    def holds(self, file_path):
+        """
+        Checks if this worker still holds the lease of a paper.
+        """
+        return self.owns(self.lease_path(file_path))
+
+    def read_token(self, lease_path):
+        try:
+            with open(lease_path, 'r', encoding='utf-8') as file:
+                return json.load(file).get('token')
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def is_stale(self, lease_path):
+        """
+        Checks if the heartbeat of a lease is older than the lease timeout.
+        """
+        try:
+            return time.time() - os.path.getmtime(lease_path) > self.lease_timeout
+        except FileNotFoundError:
+            return False
+
+    def acquire(self, lease_path):
+        """
+        Tries to acquire a lease file. Expired leases of crashed workers are reclaimed.
+        :param lease_path: Path of the lease file.
+        :return: True if the lease was acquired, False otherwise.
+        """
+        token = uuid.uuid4().hex
+        content = json.dumps({'worker': self.worker_id, 'token': token, 'claimed': time.time()})
+
+        for _ in range(2):
+            # creating the file exclusively is atomic, so only one worker can win
+            try:
+                fd = os.open(lease_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                observed_token = self.read_token(lease_path)
+                if not self.is_stale(lease_path):
+                    return False
+
+                # move expired lease out of the way (rename is atomic, only one worker succeeds)
+                stale_path = f'{lease_path}.{token}.stale'
+                try:
+                    os.rename(lease_path, stale_path)
+                except FileNotFoundError:
+                    continue
+
+                # another worker may have reclaimed the lease in the meantime: put its fresh lease back
+                # (link does not replace, so a lease created in the meantime is never overwritten)
+                if not self.is_stale(stale_path) or self.read_token(stale_path) != observed_token:
+                    try:
+                        os.link(stale_path, lease_path)
+                    except FileExistsError:
+                        logging.warning(f'Lease {os.path.basename(lease_path)} was taken over while it was restored.')
+                    os.remove(stale_path)
+                    return False
+                logging.warning(f'Reclaiming expired lease: {os.path.basename(lease_path)}')
+                os.remove(stale_path)
+                continue
+
+            with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                file.write(content)
+            self.leases[lease_path] = token
+            self.start_heartbeat()
+            return True
+
+        return False
+
+    def owns(self, lease_path):
+        """
+        Checks if this worker still holds the given lease.
+        """
+        token = self.leases.get(lease_path)
+        return token is not None and self.read_token(lease_path) == token
+
+    def release(self, lease_path):
+        """
+        Releases a lease held by this worker.
+        """
+        if self.owns(lease_path):
+            try:
+                os.remove(lease_path)
+            except FileNotFoundError:
+                pass
+        self.leases.pop(lease_path, None)
+
+    def start_heartbeat(self):
+        if self.heartbeat_thread is None or not self.heartbeat_thread.is_alive():
+            self.stop_heartbeat.clear()
+            self.heartbeat_thread = threading.Thread(target=self.heartbeat, daemon=True)
+            self.heartbeat_thread.start()
+
+    def heartbeat(self):
+        """
+        Refreshes the modification time of all held leases so that they do not expire.
+        """
+        while not self.stop_heartbeat.wait(self.heartbeat_interval):
+            for lease_path in list(self.leases):
+                if self.owns(lease_path):
+                    try:
+                        os.utime(lease_path)
+                    except FileNotFoundError:
+                        pass
+                else:
+                    logging.warning(f'Lost lease: {os.path.basename(lease_path)}')
+                    self.leases.pop(lease_path, None)
+
+    def shutdown(self):
+        """
+        Releases all leases and stops the heartbeat.
+        """
+        for lease_path in list(self.leases):
+            self.release(lease_path)
+        self.stop_heartbeat.set()
+
+    def claim(self, file_path):
+        """
+        Claims a paper for this worker.
+        :param file_path: Path of the PDF file.
+        :return: True if the paper was claimed, False if it is done or leased by another worker.
+        """
+        if self.is_done(file_path) or self.failed_in_run(file_path):
+            return False
+
+        lease_path = self.lease_path(file_path)
+        if not self.acquire(lease_path):
+            return False
+
+        # paper may have been finished (and removed) while acquiring the lease
+        if self.is_done(file_path) or self.failed_in_run(file_path) or not os.path.exists(file_path):
+            self.release(lease_path)
+            return False
+
+        logging.info(f'Worker {self.worker_id} claimed: {os.path.basename(file_path)}')
+        return True
+
+    def claim_batch(self, max_papers=1):
+        """
+        Claims up to max_papers papers that are neither done nor leased by another worker.
+        :param max_papers: Maximum number of papers to claim.
+        :return: List of claimed file paths.
+        """
+        claimed = []
+        for file_path in self.list_papers():
+            if len(claimed) >= max_papers:
+                break
+            if self.claim(file_path):
+                claimed.append(file_path)
+        return claimed
+
+    def complete(self, file_path, record, remove_pdf=False):
+        """
+        Stores the result record of a processed paper and releases its lease.
+        Records of failed papers are stored in the failed folder, so that the paper is retried in the next run.
+        :param file_path: Path of the PDF file.
+        :param record: Dictionary with the results (e.g. summary, audio file) and the status ('done' or 'failed').
+        :param remove_pdf: If True, removes the PDF while the lease is still held.
+        :return: True if the record was stored, False if the lease was lost in the meantime.
+        """
+        lease_path = self.lease_path(file_path)
+        if not self.owns(lease_path):
+            logging.warning(f'Lease for {os.path.basename(file_path)} was lost, result is discarded.')
+            self.leases.pop(lease_path, None)
+            return False
+
+        record = {**record, 'file': os.path.basename(file_path), 'worker': self.worker_id}
+        if record.get('status') == 'failed':
+            atomic_write(self.record_path(file_path, self.failed_dir), json.dumps(record, ensure_ascii=False))
+            self.release(lease_path)
+            return True
+
+        # remove pdf before the record is written, so that the report never sees a half removed paper
+        if remove_pdf:
+            logging.info('Remove PDF after processing')
+            os.remove(file_path)
+
+        atomic_write(self.record_path(file_path), json.dumps(record, ensure_ascii=False))
+        failed_record = self.record_path(file_path, self.failed_dir)
+        if os.path.exists(failed_record):
+            os.remove(failed_record)
+        self.release(lease_path)
+        return True
+
+    def report(self, send_report):
+        """
+        Hands all unreported results to send_report exactly once per batch.
+        Only one worker can hold the report lease, results are moved to the reported folder afterwards.
+        :param send_report: Function that receives the list of result records.
+        :return: True if this worker sent the report, False otherwise.
+        """
+        if not self.acquire(self.report_lease):
+            return False
+
+        try:
+            record_files = sorted(glob.glob(os.path.join(self.done_dir, '*.json')))
+            if not record_files:
+                return False
+
+            records = []
+            for record_file in record_files:
+                with open(record_file, 'r', encoding='utf-8') as file:
+                    records.append(json.load(file))
+
+            send_report(records)
+
+            # archive results (records of removed papers are not needed anymore)
+            for record_file, record in zip(record_files, records):
+                if os.path.exists(os.path.join(self.file_directory, record['file'])):
+                    os.replace(record_file, os.path.join(self.reported_dir, os.path.basename(record_file)))
+                else:
+                    os.remove(record_file)
+            return True
+
+        finally:
+            self.release(self.report_lease)
+
+
+class RequestPacker(PaperSummarizer):
+    def __init__(self, token_budget=None, max_document_tokens=None, max_documents=None):
+        """
+        Initializes the packer that groups short documents into shared completions.
+        :param token_budget: Maximum number of document tokens per request.
+        :param max_document_tokens: Documents with more tokens always get their own request.
+        :param max_documents: Maximum number of documents per request (limits the length of the response).
+        """
+        self.token_budget = int(token_budget if token_budget is not None else self.settings.get('Packing_Token_Budget', 12000))
+        self.max_document_tokens = int(max_document_tokens if max_document_tokens is not None else self.settings.get('Packing_Max_Paper_Tokens', 3000))
+        self.max_documents = int(max_documents if max_documents is not None else self.settings.get('Packing_Max_Documents', 5))
+
+    def pack(self, n_tokens):
+        """
+        Groups documents into packs that fit into the token budget (first fit, in order of the documents).
+        :param n_tokens: List with the number of tokens of every document.
+        :return: List of packs (lists of document indices) with at least two documents each.
+        """
+        packs = []
+        for i, n in enumerate(n_tokens):
+            if n > self.max_document_tokens:
+                continue
+            for pack in packs:
+                if len(pack['indices']) < self.max_documents and pack['tokens'] + n <= self.token_budget:
+                    pack['indices'].append(i)
+                    pack['tokens'] += n
+                    break
+            else:
+                packs.append({'indices': [i], 'tokens': n})
+
+        return [pack['indices'] for pack in packs if len(pack['indices']) > 1]
+
+    def create_summaries(self, papers, filenames=None, model_name=None):
+        """
+        Creates the summaries of several papers. Short papers are summarized together, papers that are too long
+        or whose packed answer could not be parsed are summarized with their own request.
+        :param papers: List of RichPaper objects (paper_metrices must be available).
+        :param filenames: List of file names to save the summaries to (file format is added automatically (.txt)).
+        :param model_name: The name of the model to use ('gpt-4o-mini' as default).
+        """
+        filenames = filenames if filenames is not None else [None] * len(papers)
+        n_tokens = [paper.paper_metrices['n_tokens_paper'] if paper.paper else float('inf') for paper in papers]
+        packs = self.pack(n_tokens)
+        packed = {i for pack in packs for i in pack}
+        done = set()
+
+        for pack in packs:
+            logging.info(f'Create packed summary of {len(pack)} papers ({sum(n_tokens[i] for i in pack)} tokens)')
+            task = RichPaper.summary_prompt.replace('the following research paper', 'each of the following research papers') + self.language_suffix()
+            answers = self.call_model_packed(RichPaper.summary_instruction, task, [papers[i].paper for i in pack], model_name=model_name)
+
+            for i, answer in zip(pack, answers):
+                if answer is None:
+                    continue
+                papers[i].summary = answer
+                PaperSummarizer.created_summaries.append(answer)
+                if filenames[i]:
+                    atomic_write(f'{filenames[i]}.txt', answer)
+                done.add(i)
+
+        # summarize remaining papers one by one
+        for i, paper in enumerate(papers):
+            if i not in done:
+                if i in packed:
+                    logging.info(f'Packed summary failed, create separate summary for {paper.path}')
+                paper.create_summary(model_name=model_name, filename=filenames[i])
+
+    def create_one_line_summaries(self, summaries, model_name=None):
+        """
+        Creates one-line summaries of several texts, packed into shared requests where possible.
+        :param summaries: List of texts to summarize.
+        :param model_name: The name of the model to use.
+        :return: List of one-line summaries.
+        """
+        summaries = [summary or '' for summary in summaries]
+        essences = [None] * len(summaries)
+        n_tokens = [self.num_tokens_from_string(summary, 'o200k_base') for summary in summaries]
+
+        for pack in self.pack(n_tokens):
+            logging.info(f'Create packed one-line summary of {len(pack)} texts')
+            answers = self.call_model_packed(NotionManager.one_line_instruction, 'Summarize each of the following documents in one line.', [summaries[i] for i in pack], model_name=model_name)
+            for i, answer in zip(pack, answers):
+                essences[i] = answer
+
+        # summarize remaining texts one by one
+        for i, summary in enumerate(summaries):
+            if essences[i] is None:
+                essences[i] = self.call_model(NotionManager.one_line_instruction, summary, model_name=model_name)
+
+        return essences
+
+
+class BatchPlanner(PaperSummarizer):
+    stages = ['metadata', 'summary', 'audio', 'essence']
+
+    def __init__(self, create_summary=True, create_audio=True, include_notion=False, keep_texts=True):
+        """
+        Initializes the pre-flight planner which estimates tokens, costs and duration of a batch without calling any model.
+        :param create_summary: If True, summaries are planned.
+        :param create_audio: If True, audio files are planned (requires summaries).
+        :param include_notion: If True, one-line summaries for Notion are planned.
+        :param keep_texts: If True, extracted texts are kept for the execution of the plan (otherwise only token counts).
+        """
+        self.create_summary = create_summary
+        self.create_audio = create_summary and create_audio
+        self.include_notion = include_notion
+        self.routing_rules = self.settings.get('Routing_Rules', [])
+        self.budget = self.settings.get('Batch_Budget')
+        self.summary_tokens = int(self.settings.get('Planner_Summary_Tokens', 800))
+        self.audio_token_factor = float(self.settings.get('Planner_Audio_Token_Factor', 6))
+        self.default_tokens_per_second = float(self.settings.get('Planner_Default_Tokens_Per_Second', 50))
+        self.throughput = self.load_throughput()
+
+        # extracted texts and token counts (path -> (text, n_tokens)), reused when the plan is executed
+        self.keep_texts = keep_texts
+        self.extracted = {}
+
+    def route(self, stage, n_tokens):
+        """
+        Selects the model for a stage based on the routing rules in the settings (first matching rule wins).
+        A rule looks like {"stage": "summary", "min_tokens": 50000, "model": "gpt-4.1-nano"}.
+        :param stage: One of 'metadata', 'summary', 'audio' or 'essence'.
+        :param n_tokens: Number of tokens of the paper.
+        :return: Name of the model ('local' means that no model is called).
+        """
+        for rule in self.routing_rules:
+            if rule.get('stage') == stage and rule.get('min_tokens', 0) <= n_tokens <= rule.get('max_tokens', float('inf')):
+                return rule['model']
+
+        if stage == 'audio':
+            return self.settings.get('Audio_Model', 'gpt-4o-mini-audio-preview')
+        return self.settings.get('Summarizer_Model', 'gpt-4o-mini')
+
+    def route_paper(self, n_tokens):
+        """
+        Selects the models of all stages for a paper.
+        """
+        return {stage: self.route(stage, n_tokens) for stage in self.stages}
+
+    def estimate(self, model_name, input_tokens, output_tokens, out_modality='text'):
+        """
+        Estimates costs and duration of a model call.
+        :param model_name: Name of the model.
+        :param input_tokens: Number of input tokens.
+        :param output_tokens: Number of output tokens.
+        :param out_modality: Modality of the output ('text' or 'audio').
+        :return: Dictionary with model, tokens, cost (None if the model has no price factors) and seconds.
+        """
+        if model_name == 'local':
+            return {'model': model_name, 'input_tokens': 0, 'output_tokens': 0, 'cost': 0, 'seconds': 0}
+
+        try:
+            input_factor, output_factor = self.get_price_factors(model_name, 'text', out_modality)
+            cost = round((input_tokens / 1000000) * input_factor + (output_tokens / 1000000) * output_factor, 4)
+        except ValueError as e:
+            logging.warning(f'{e} Costs of this model are unknown.')
+            cost = None
+
+        # use measured throughput of previous runs if available
+        measurement = self.throughput.get(model_name, {})
+        if measurement.get('output_tokens'):
+            seconds_per_token = measurement['seconds'] / measurement['output_tokens']
+        else:
+            seconds_per_token = 1 / self.default_tokens_per_second
+        seconds = (output_tokens or input_tokens) * seconds_per_token
+
+        return {'model': model_name, 'input_tokens': input_tokens, 'output_tokens': output_tokens, 'cost': cost, 'seconds': round(seconds, 1)}
+
+    def plan_paper(self, file_path):
+        """
+        Extracts and tokenizes a paper and plans all stages for it.
+        :param file_path: Path of the PDF file.
+        :return: Dictionary with models and estimates per stage.
+        """
+        paper = RichPaper(path=file_path)
+        paper.read_pdf()
+        if not paper.paper:
+            return {'path': file_path, 'file': os.path.basename(file_path), 'error': 'PDF could not be read.', 'models': {}, 'stages': {}, 'cost': 0, 'seconds': 0}
+
+        n_tokens = self.num_tokens_from_string(paper.paper, 'o200k_base')
+        self.extracted[file_path] = (paper.paper if self.keep_texts else None, n_tokens)
+        models = self.route_paper(n_tokens)
+        stages = {}
+
+        # meta data is only requested from the LLM if the document name does not contain it
+        filename = os.path.splitext(os.path.basename(file_path))[0]
+        if not re.match(RichPaper.metadata_pattern, filename):
+            input_tokens = self.num_tokens_from_string(RichPaper.metadata_instruction + paper.paper[:1000], 'o200k_base')
+            stages['metadata'] = self.estimate(models['metadata'], input_tokens, 50)
+
+        if self.create_summary:
+            input_tokens = n_tokens + self.num_tokens_from_string(RichPaper.summary_instruction + RichPaper.summary_prompt, 'o200k_base')
+            stages['summary'] = self.estimate(models['summary'], input_tokens, self.summary_tokens)
+
+        if self.create_audio:
+            model_name = models['audio']
+            if 'audio-preview' in model_name:
+                stages['audio'] = self.estimate(model_name, self.summary_tokens, int(self.summary_tokens * self.audio_token_factor), out_modality='audio')
+            else:
+                stages['audio'] = self.estimate(model_name, self.summary_tokens, 0)
+
+        if self.include_notion:
+            stages['essence'] = self.estimate(models['essence'], self.summary_tokens, 40)
+
+        return {
+            'path': file_path,
+            'file': os.path.basename(file_path),
+            'n_tokens': n_tokens,
+            'models': models,
+            'stages': stages,
+            'cost': round(sum(stage['cost'] or 0 for stage in stages.values()), 4),
+            'seconds': round(sum(stage['seconds'] for stage in stages.values()), 1)
+        }
+
+    def create_plan(self, file_paths):
+        """
+        Plans a batch of papers and sums up tokens, costs and duration per stage.
+        :param file_paths: List of PDF files.
+        :return: Dictionary with the plan of every paper, the totals and the budget check.
+        """
+        papers = []
+        for file_path in file_paths:
+            logging.info(f'Plan PDF file: {file_path}')
+            papers.append(self.plan_paper(file_path))
+
+        totals = {}
+        unpriced_models = set()
+        for paper in papers:
+            for stage, estimate in paper['stages'].items():
+                total = totals.setdefault(stage, {'calls': 0, 'input_tokens': 0, 'output_tokens': 0, 'cost': 0, 'seconds': 0})
+                total['calls'] += 0 if estimate['model'] == 'local' else 1
+                for key in ['input_tokens', 'output_tokens', 'seconds']:
+                    total[key] += estimate[key]
+                if estimate['cost'] is None:
+                    unpriced_models.add(estimate['model'])
+                else:
+                    total['cost'] += estimate['cost']
+
+        for total in totals.values():
+            total['cost'] = round(total['cost'], 4)
+            total['seconds'] = round(total['seconds'], 1)
+
+        cost = round(sum(total['cost'] for total in totals.values()), 4)
+        return {
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'papers': papers,
+            'stages': totals,
+            'cost': cost,
+            'seconds': round(sum(total['seconds'] for total in totals.values()), 1),
+            'unpriced_models': sorted(unpriced_models),
+            'budget': self.budget
+        }
+
+    def check_budget(self, plan):
+        """
+        Checks if the estimated costs of a plan are within the configured budget ('Batch_Budget').
+        Plans that use models with unknown costs are rejected if a budget is configured.
+        """
+        if self.budget is None:
+            return True
+        if plan.get('unpriced_models'):
+            logging.error(f"Costs of {', '.join(plan['unpriced_models'])} are unknown, the budget cannot be checked.")
+            return False
+        if plan['cost'] <= float(self.budget):
+            return True
+        logging.error(f"Estimated costs of {plan['cost']:.4f}$ exceed the budget of {float(self.budget):.4f}$.")
+        return False
+
+    def log_plan(self, plan):
+        """
+        Logs the estimates of a plan per stage.
+        """
+        for stage, total in plan['stages'].items():
+            logging.info(f"Plan | {stage}: {total['calls']} calls | {total['input_tokens']} input tokens | {total['output_tokens']} output tokens | {total['cost']:.4f}$ | {total['seconds'] / 60:.1f} min")
+        logging.info(f"Plan | total: {len(plan['papers'])} papers | {plan['cost']:.4f}$ | {plan['seconds'] / 60:.1f} min | budget: {plan['budget']}")
+        if plan.get('unpriced_models'):
+            logging.warning(f"Plan | costs not included for: {', '.join(plan['unpriced_models'])}")
+
+    def save_plan(self, plan, path=None):
+        """
+        Saves a plan as JSON file so that it can be reviewed and executed later.
+        :param plan: Plan created with create_plan.
+        :param path: Path of the plan file ('plan.json' as default).
+        """
+        path = path if path is not None else self.settings.get('Plan_File', 'plan.json')
+        atomic_write(path, json.dumps(plan, indent=4, ensure_ascii=False))
+        logging.info(f'Plan saved to {path}')
+
+    def load_plan(self, path=None):
+        """
+        Loads a plan saved with save_plan.
+        :param path: Path of the plan file ('plan.json' as default).
+        :return: The plan.
+        """
+        path = path if path is not None else self.settings.get('Plan_File', 'plan.json')
+        with open(path, 'r', encoding='utf-8') as file:
+            plan = json.load(file)
+
+        # the token counts of the plan are reused, the texts are read again when the papers are processed
+        for paper in plan['papers']:
+            self.extracted[paper['path']] = (None, paper['n_tokens'])
+        return plan